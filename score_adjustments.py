@@ -8,6 +8,8 @@ Meant for Data Science UCSB's events. Written by Daniel Naylor.
 # Requirements
     - Numpy   >= 2.2.5    (https://pypi.org/project/numpy/)
     - Pandas  >= 2.2.3    (https://pypi.org/project/pandas/)
+    - Numba   >= 0.61.0   (https://pypi.org/project/numba/)
+        - Optional. Only required for `kappa_adjusted(..., engine='numba')`.
     - GSheets >= 0.6.1    (https://pypi.org/project/gsheets/)
         - Only required if used in conjunction with `score_tools.py`
 
@@ -21,6 +23,9 @@ Meant for Data Science UCSB's events. Written by Daniel Naylor.
 
     - `showcase_prescreening_score`: A weighted average between attendance and adjusted score.
 '''
+import functools
+from typing import Literal
+
 import pandas as pd
 import numpy as np
 
@@ -29,18 +34,112 @@ def _normalize(arr: np.ndarray | pd.Series, /) -> np.ndarray | pd.Series:
     '''
     f: [a,b] -> [0, 1]
     f(x) = (x - a) / (b - a)
+
+    If every value is the same (a = b), everything is mapped to 0. Missing values stay missing.
     '''
     a = arr.min()
     b = arr.max()
 
-    return (arr - a) / (b - a)
+    if a == b:
+        zeros = np.where(pd.isna(arr), np.nan, 0.0)
+        return pd.Series(zeros, index=arr.index) if isinstance(arr, pd.Series) else zeros
+
+    # one buffer for both passes
+    vals = arr.to_numpy(dtype=np.float64, copy=True) if isinstance(arr, pd.Series) else arr.astype(np.float64)
+    np.subtract(vals, a, out=vals)
+    vals /= b - a
+
+    return pd.Series(vals, index=arr.index) if isinstance(arr, pd.Series) else vals
+
+
+def _rescale(scores: pd.Series, normalize: Literal['minmax', 'rank'] | bool | None, /) -> pd.Series:
+    '''
+    Apply the `normalize` option of the scoring methods to `scores`.
+    '''
+    if isinstance(normalize, str):
+        if normalize == 'minmax':
+            return _normalize(scores)
+        if normalize == 'rank':
+            return scores.rank(pct=True)
+
+        raise ValueError(f'Unknown normalization "{normalize}".')
+
+    # anything else keeps the old boolean meaning: truthy rescales linearly
+    return _normalize(scores) if normalize else scores
+
+
+def _sort_descending(scores: pd.Series, top_k: int | None = None, /) -> pd.Series:
+    '''
+    Sort `scores` in descending order. If `top_k` is given, only the `top_k` highest are kept.
+    These are selected with a partition, so only `top_k` elements are actually sorted.
+    '''
+    if top_k is not None and top_k < 1:
+        raise ValueError(f'"top_k" must be at least 1, got {top_k}.')
+
+    if top_k is None or top_k >= len(scores):
+        return scores.sort_values(ascending=False)
+
+    vals = scores.to_numpy()
+    idx = np.argpartition(-vals, top_k)[:top_k]
+    idx = idx[np.argsort(-vals[idx], kind='stable')]
+
+    return scores.iloc[idx]
+
+
+def _to_array(scores: pd.DataFrame, /) -> np.ndarray:
+    '''
+    Return the values of `scores` as a C-contiguous float32 array.
+    Pandas frames are often column-major, which makes the row-wise reductions below stride through memory.
+    Single precision is plenty for the scores themselves, and halves the memory traffic.
+    Anything that can grow large (e.g. `std^kappa`) must not be formed in float32; see `kappa_adjusted`.
+    '''
+    return np.ascontiguousarray(scores.to_numpy(dtype=np.float32))
+
+
+def _kappa_kernel(
+        diff: np.ndarray,
+        std_factor: np.ndarray,
+        inv_1pk: float
+) -> np.ndarray:
+    '''
+    Row-wise sum of `sign(d) * (|d| * std^k)^(1 / (1 + k))`, where `d` are the centered scores.
+    This is evaluated as `sign(d) * |d|^(1 / (1 + k)) * std_factor`, with `std_factor = std^(k / (1 + k))`.
+    Missing scores are expected to already be centered to zero, so they contribute nothing.
+    Written as plain loops so that Numba can fuse it into a single pass. See `_compiled_kappa_kernel`.
+    '''
+    nrows, njudges = diff.shape
+    out = np.empty(nrows)
+
+    for i in range(nrows):
+        acc = 0.0
+        for j in range(njudges):
+            d = diff[i, j]
+            s = 1.0 if d > 0 else (-1.0 if d < 0 else 0.0)
+            x = np.sqrt(abs(d)) if inv_1pk == 0.5 else abs(d) ** inv_1pk # kappa = 1 is just a square root
+            acc += s * x * std_factor[j]
+        out[i] = acc
+
+    return out
+
+
+@functools.cache
+def _compiled_kappa_kernel():
+    '''
+    Compile `_kappa_kernel` with Numba. This is only done on first use,
+    since importing Numba and compiling costs far more than the kernel saves on typical datasets.
+    '''
+    from numba import njit
+
+    return njit(fastmath=True, cache=True)(_kappa_kernel)
 
 
 def kappa_adjusted(
         scores: pd.DataFrame,
         *,
         kappa: int = 1,
-        normalize: bool = True
+        normalize: Literal['minmax', 'rank'] | bool | None = 'minmax',
+        top_k: int | None = None,
+        engine: Literal['numpy', 'numba'] = 'numpy'
 ) -> pd.Series:
     '''
     Compute the Kappa-Adjusted score of a given dataset of scores.
@@ -51,26 +150,73 @@ def kappa_adjusted(
                         each row is assumed to be a single project. The row labels should be the project names.
         - `kappa`:        A hyperparameter for the score adjustment. 
                         Note that the ordering of `kappa=0` is equivalent to zero adjustment, i.e. using raw scores.
-        - `normalize`:    Whether to normalize the final scores onto a range of `[0, 1]`. Default is True.
+        - `normalize`:    How to map the final scores onto a range of `[0, 1]`. Default is `'minmax'`.
+                        `'minmax'` (or any truthy value) rescales linearly, `'rank'` uses percentile ranks,
+                        and any falsy value (False, None) returns the raw adjusted scores.
+        - `top_k`:        If given, only return the `top_k` highest scoring projects. Default is None (all projects).
+        - `engine`:       `'numpy'` (default) or `'numba'`. The latter compiles the adjustment into a single loop,
+                        which requires Numba and only pays off for very large datasets.
     ## Return
         A pandas series object, whose indices are `scores` indices, and whose values are the adjusted score.
         Note that this series is sorted in descending order.
+    ## Raises
+        - `ValueError`: `normalize` is a string other than `'minmax'` or `'rank'`.
+        - `ValueError`: `top_k` is less than 1.
+        - `ValueError`: `engine` is not `'numpy'` or `'numba'`.
+        - `ImportError`: `engine='numba'` is given, but Numba is not installed.
     '''
-    avg_scores = scores.mean(axis=0)
-    std_scores = scores.std(axis=0)
+    if engine not in ('numpy', 'numba'):
+        raise ValueError(f'Unknown engine "{engine}".')
 
-    adjusted_scores = np.sum(
-        np.sign(scores - avg_scores) * (np.abs(scores - avg_scores) * std_scores**kappa) ** (1 / (1 + kappa)),
-        axis=1
-    )
-    normalized_scores = _normalize(adjusted_scores) if normalize else adjusted_scores
+    arr = _to_array(scores)
+    missing = np.isnan(arr)
+    counts = arr.shape[0] - missing.sum(axis=0)
 
-    return normalized_scores.sort_values(ascending=False)
+    # one buffer and one mask for the mean, the std and the adjustment below.
+    # a missing score has d = 0, so it contributes nothing to any of them.
+    diff = np.where(missing, 0.0, arr)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_scores = diff.sum(axis=0) / counts
+        diff -= avg_scores
+        np.copyto(diff, 0.0, where=missing)
+
+        # sample standard deviation, to match pandas
+        std_scores = np.sqrt(np.einsum('ij,ij->j', diff, diff) / (counts - 1))
+
+    # hoisted out of the hot path: one value per judge, not per score.
+    # (|d| * std^k)^(1 / (1 + k)) = |d|^(1 / (1 + k)) * std^(k / (1 + k)), and the right-hand side
+    # stays bounded in float32 where std^k alone would overflow for large kappa.
+    # a judge with an undefined std (fewer than two scores) contributes nothing.
+    std_factor = np.nan_to_num(std_scores ** (kappa / (1 + kappa)), nan=0.0).astype(arr.dtype)
+    inv_1pk = arr.dtype.type(1 / (1 + kappa))
+
+    if kappa == 0:
+        # sign(d) * |d|^1 = d, so this is just the row-sum of the centered scores
+        adjusted = diff.sum(axis=1)
+    elif engine == 'numba':
+        adjusted = _compiled_kappa_kernel()(diff, std_factor, inv_1pk)
+    else:
+        # reuse the centered buffer for the root of |d| and the std factor
+        sign = np.sign(diff)
+        np.abs(diff, out=diff)
+        if kappa == 1:
+            np.sqrt(diff, out=diff)
+        else:
+            diff **= inv_1pk
+        diff *= std_factor
+        adjusted = np.einsum('ij,ij->i', sign, diff) # fused row-sum of sign * root
+
+    adjusted_scores = pd.Series(adjusted.astype(np.float64, copy=False), index=scores.index)
+    normalized_scores = _rescale(adjusted_scores, normalize)
+
+    return _sort_descending(normalized_scores, top_k)
 
 def proportional_variance(
         scores: pd.DataFrame,
         *,
-        normalize: bool = True
+        normalize: Literal['minmax', 'rank'] | bool | None = 'minmax',
+        top_k: int | None = None
     ) -> pd.Series:
     '''
     Compute the Proportional-Variance score of a given dataset of scores.
@@ -80,21 +226,44 @@ def proportional_variance(
     ## Parameters
         - `scores`:       A DataFrame of project scores. Each column is assumed to be a judge, while
                         each row is assumed to be a single project. The row labels should be the project names.
-        - `normalize`:    Whether to normalize the final scores onto a range of `[0, 1]`. Default is True.
+        - `normalize`:    How to map the final scores onto a range of `[0, 1]`. Default is `'minmax'`.
+                        `'minmax'` (or any truthy value) rescales linearly, `'rank'` uses percentile ranks,
+                        and any falsy value (False, None) returns the raw adjusted scores.
+        - `top_k`:        If given, only return the `top_k` highest scoring projects. Default is None (all projects).
     ## Return
         A pandas series object, whose indices are `scores` indices, and whose values are the adjusted score.
         Note that this series is sorted in descending order.
+    ## Raises
+        - `ValueError`: `normalize` is a string other than `'minmax'` or `'rank'`.
+        - `ValueError`: `top_k` is less than 1.
     '''
-    std_scores = scores.var(axis=0)
-    weights = std_scores / std_scores.sum()
+    arr = _to_array(scores)
+    missing = np.isnan(arr)
+    counts = arr.shape[0] - missing.sum(axis=0)
 
-    adjusted_scores = np.sum(
-        weights * scores, # multiply each judge's score by their weights
-        axis=1
+    # one buffer and one mask, as in `kappa_adjusted`: centered for the variance, then shifted back.
+    # a missing score is zero in both, so it contributes nothing to either.
+    filled = np.where(missing, 0.0, arr)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_scores = filled.sum(axis=0) / counts
+        filled -= avg_scores
+        np.copyto(filled, 0.0, where=missing)
+
+        # sample variance, to match pandas
+        var_scores = np.einsum('ij,ij->j', filled, filled) / (counts - 1)
+        weights = np.nan_to_num(var_scores / np.nansum(var_scores), nan=0.0).astype(arr.dtype)
+
+        filled += avg_scores
+        np.copyto(filled, 0.0, where=missing)
+
+    adjusted_scores = pd.Series(
+        np.einsum('ij,j->i', filled, weights).astype(np.float64), # weighted sum of each judge's score, in one fused pass
+        index=scores.index
     )
-    normalized_scores = _normalize(adjusted_scores) if normalize else adjusted_scores
+    normalized_scores = _rescale(adjusted_scores, normalize)
 
-    return normalized_scores.sort_values(ascending=False)
+    return _sort_descending(normalized_scores, top_k)
 
 def showcase_prescreening_score(
         scores: pd.Series,
@@ -118,9 +287,15 @@ def showcase_prescreening_score(
         If given `None`, then this assumes that the indices are the same. See `get_name_number_pairs`.
     '''
     if mapping is not None:
-        attendance = pd.Series(attendance.values, index=[mapping[x] for x in attendance.index])
+        # strict, like indexing `mapping` directly: an attendance label missing from `mapping` raises KeyError
+        attendance = attendance.set_axis(attendance.index.map(mapping.__getitem__))
+
+    # align once, then mix on the raw arrays so pandas doesn't re-align each operand
+    att = attendance.loc[scores.index].to_numpy(dtype=np.float64)
+    out = scores.to_numpy(dtype=np.float64) * (1 - attendance_ratio)
+    out += att * attendance_ratio
 
-    return scores * (1 - attendance_ratio) + attendance.loc[scores.index] * attendance_ratio
+    return pd.Series(out, index=scores.index)
 
 if __name__ == '__main__':
     import score_tools
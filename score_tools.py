@@ -6,8 +6,12 @@ methods in `score_adjustments.py` can accept.
 Meant for Data Science UCSB's events. Written by Daniel Naylor.
 
 # Requirements
+  - Numpy   >= 2.2.5    (https://pypi.org/project/numpy/)
   - Pandas  >= 2.2.3    (https://pypi.org/project/pandas/)
   - GSheets >= 0.6.1    (https://pypi.org/project/gsheets/)
+  - PyArrow >= 19.0.0   (https://pypi.org/project/pyarrow/)
+      - Optional. If installed, CSV files are read with the (multithreaded) PyArrow parser.
+        See `_read_csv` for how its results differ from the default parser.
 
 # Methods
     - `get_project_scores`:     Return a DataFrame of raw scores that can be passed into other methods
@@ -15,9 +19,32 @@ Meant for Data Science UCSB's events. Written by Daniel Naylor.
     - `get_name_number_pairs`:  Return a dictionary mapping Project Names to Project Numbers.
 '''
 import pandas as pd
+import numpy as np
 import gsheets as gs
 
 
+def _read_csv(path: str, /) -> pd.DataFrame:
+    '''
+    `pd.read_csv`, using the PyArrow engine if it is available.
+
+    The PyArrow engine does not de-duplicate repeated headers (`Judge, Judge` rather than `Judge, Judge.1`),
+    so such files are re-read with the default parser to keep the usual column names.
+
+    Other than that, PyArrow infers types on its own. Most notably, date-like values (e.g. `2024-01-10`)
+    are parsed into `datetime.date` objects rather than left as strings. This only matters for
+    non-score columns, such as a date-like `index`; pass a DataFrame read with `pd.read_csv` to avoid it.
+    '''
+    try:
+        raw_data = pd.read_csv(path, engine='pyarrow')
+    except ImportError:
+        return pd.read_csv(path)
+
+    if raw_data.columns.has_duplicates:
+        return pd.read_csv(path)
+
+    return raw_data
+
+
 def get_project_scores(
         csv_or_frame: str | pd.DataFrame | None = None,
         *,
@@ -66,15 +93,16 @@ def get_project_scores(
         s = gs.Sheets.from_files(credentials)
         raw_data: pd.DataFrame = s.get(sheet_id).first_sheet.to_frame()
     else:
-        raw_data = pd.read_csv(csv_or_frame) if type(csv_or_frame) == str else csv_or_frame.copy()
+        raw_data = _read_csv(csv_or_frame) if isinstance(csv_or_frame, str) else csv_or_frame
 
-    raw_data.set_index(
-        index, 
-        inplace=True,
-        drop=True
-    )
-    raw_data.drop(ignored_cols, inplace=True, axis=1)
-    return raw_data.select_dtypes(['number'])
+    raw_data = raw_data.set_index(index, drop=True)
+
+    # select every judge column at once, rather than dropping and filtering in separate passes
+    judges = ~raw_data.columns.isin(ignored_cols) & raw_data.dtypes.map(
+        lambda dtype: pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+    ).to_numpy(dtype=bool)
+
+    return raw_data.loc[:, judges]
 
 def get_attendance_scores(
         csv_or_frame: str | pd.DataFrame | None = None,
@@ -134,16 +162,17 @@ def get_attendance_scores(
         s = gs.Sheets.from_files(credentials)
         raw_data: pd.DataFrame = s.get(sheet_id).sheets[page_num].to_frame()
     else:
-        raw_data = pd.read_csv(csv_or_frame) if type(csv_or_frame) == str else csv_or_frame.copy()
+        raw_data = _read_csv(csv_or_frame) if isinstance(csv_or_frame, str) else csv_or_frame
 
-    raw_data.set_index(
-        index, 
-        inplace=True,
-        drop=True
-    )
-    raw_data.drop(ignored_cols, inplace=True, axis=1)
+    raw_data = raw_data.set_index(index, drop=True)
+    dates = ~raw_data.columns.isin(ignored_cols)
 
-    return raw_data.count(axis=1) / raw_data.shape[1]
+    present = raw_data.loc[:, dates].notna().to_numpy(dtype=bool)
+
+    return pd.Series(
+        present.sum(axis=1, dtype=np.int32) / present.shape[1],
+        index=raw_data.index
+    )
 
 def get_number_name_pairs(
         csv_or_frame: str | pd.DataFrame | None = None,
@@ -180,9 +209,12 @@ def get_number_name_pairs(
         s = gs.Sheets.from_files(credentials)
         raw_data: pd.DataFrame = s.get(sheet_id).first_sheet.to_frame()
     else:
-        raw_data = pd.read_csv(csv_or_frame) if type(csv_or_frame) == str else csv_or_frame
+        raw_data = _read_csv(csv_or_frame) if isinstance(csv_or_frame, str) else csv_or_frame
+
+    nums = raw_data[num_col].to_numpy().tolist()
+    names = raw_data[name_col].to_numpy().tolist()
 
-    return dict(zip(raw_data[num_col], raw_data[name_col]))
+    return dict(zip(nums, names))
 
 if __name__ == '__main__':
     test = pd.read_csv('data.csv')